@@ -6,6 +6,7 @@ that are above or below their 200-day moving averages.
 """
 
 import sqlite3
+import numpy as np
 import pandas as pd
 import datetime
 import re
@@ -17,13 +18,26 @@ def connect_to_db(db_file: str = "funds.db") -> sqlite3.Connection:
     """Connect to the funds database."""
     if not os.path.exists(db_file):
         raise FileNotFoundError(f"Database file {db_file} not found. Run generate.py first.")
-    return sqlite3.connect(db_file)
+    conn = sqlite3.connect(db_file)
+    # Read-heavy analysis: memory-map the file, use a larger page cache and
+    # keep the ORDER BY / window sort buffers in memory
+    conn.executescript(
+        """
+        PRAGMA mmap_size = 268435456;
+        PRAGMA cache_size = -131072;
+        PRAGMA temp_store = MEMORY;
+        """
+    )
+    return conn
 
 def get_trading_days_data(conn: sqlite3.Connection) -> pd.DataFrame:
     """
     Get all NAV data excluding weekends and holidays.
     Returns DataFrame with columns: scheme_code, date, nav, scheme_name
     """
+    # Weekends (strftime '%w': Sunday=0, Saturday=6) and Liquid/Overnight Fund
+    # schemes are filtered out in SQLite so those rows are never loaded.
+    # LIKE is case-insensitive for ASCII, lower() just makes that explicit.
     query = """
     SELECT 
         n.scheme_code,
@@ -33,24 +47,92 @@ def get_trading_days_data(conn: sqlite3.Connection) -> pd.DataFrame:
     FROM nav n
     JOIN schemes s ON n.scheme_code = s.scheme_code
     WHERE n.nav IS NOT NULL
+      AND strftime('%w', n.date) NOT IN ('0', '6')
+      AND lower(s.scheme_name) NOT LIKE '%liquid fund%'
+      AND lower(s.scheme_name) NOT LIKE '%overnight fund%'
     ORDER BY n.scheme_code, n.date
     """
     
-    df = pd.read_sql_query(query, conn)
-    df['date'] = pd.to_datetime(df['date'])
-    
-    # Remove weekends (Saturday=5, Sunday=6)
-    df = df[~df['date'].dt.weekday.isin([5, 6])]
+    # scheme_code and scheme_name repeat on every NAV row of a scheme; as
+    # categoricals the values are stored once and groupby works directly on
+    # the integer codes.
+    # nav stays float64: NAVs are reported to 4 decimals, which float32
+    # cannot hold for larger NAVs.
+    # Rows arrive ordered by scheme and date (ISO date strings sort
+    # chronologically), as required by the rolling calculations
+    df = pd.read_sql_query(
+        query, conn, parse_dates=['date'],
+        dtype={'scheme_code': 'category', 'scheme_name': 'category'}
+    )
 
-    # Exclude Liquid Fund and Overnight Fund schemes (case-insensitive)
-    exclude_keywords = ['liquid fund', 'overnight fund']
-    mask = ~df['scheme_name'].str.lower().str.contains('|'.join(exclude_keywords))
-    df = df[mask]
+    return df
 
-    # Sort by scheme and date to ensure proper order for rolling calculations
-    df = df.sort_values(['scheme_code', 'date']).reset_index(drop=True)
+def _group_starts(codes: np.ndarray) -> np.ndarray:
+    """
+    Return the position of the first row of every run of equal codes.
+    Rows must be sorted by code.
+    """
+    starts = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    if len(codes) == 0:
+        return starts
+    return np.concatenate(([0], starts))
 
-    return df
+def _full_window_ends(group_starts: np.ndarray, n: int, window: int) -> np.ndarray:
+    """
+    Return the rows that close a full `window` of rows inside their own group.
+    """
+    counts = np.diff(np.append(group_starts, n))
+    ends = np.arange(window - 1, n)
+    return ends[ends - np.repeat(group_starts, counts)[ends] >= window - 1]
+
+def _rolling_mean_by_group(values: np.ndarray, group_starts: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing rolling mean within each group, using prefix sums.
+    group_starts comes from _group_starts and values must not contain NaN.
+    Rows with fewer than `window` values in their group so far are NaN.
+    """
+    n = len(values)
+    out = np.full(n, np.nan)
+    if n == 0:
+        return out
+
+    counts = np.diff(np.append(group_starts, n))
+
+    # Centre each group on its own mean so the running sum does not grow
+    # across groups and lose precision on long histories
+    row_means = np.repeat(np.add.reduceat(values, group_starts) / counts, counts)
+    csum = np.concatenate(([0.0], np.cumsum(values - row_means)))
+
+    idx = _full_window_ends(group_starts, n, window)
+    out[idx] = (csum[idx + 1] - csum[idx + 1 - window]) / window + row_means[idx]
+
+    return out
+
+def _rolling_max_by_group(values: np.ndarray, group_starts: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing rolling max within each group, ignoring NaN values.
+    group_starts comes from _group_starts. Rows with fewer than `window`
+    values in their group so far are NaN.
+    """
+    n = len(values)
+    out = np.full(n, np.nan)
+    if n < window:
+        return out
+
+    # van Herk/Gil-Werman: cut the array into blocks of `window` rows and take
+    # running maxima forwards and backwards inside each block. Any window then
+    # spans at most two blocks, so its max is the max of the suffix in the
+    # first block and the prefix in the second: O(n) regardless of window.
+    padded = np.full(-(-n // window) * window, np.nan)
+    padded[:n] = values
+    blocks = padded.reshape(-1, window)
+    prefix = np.fmax.accumulate(blocks, axis=1).ravel()
+    suffix = np.fmax.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    ends = _full_window_ends(group_starts, n, window)
+    out[ends] = np.fmax(suffix[ends - window + 1], prefix[ends])
+
+    return out
 
 def calculate_200_dma(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -58,36 +140,108 @@ def calculate_200_dma(df: pd.DataFrame) -> pd.DataFrame:
     Filters out schemes with significant NAV jumps (>10%) in the window.
     Returns DataFrame with DMA calculations.
     """
-    # Group by scheme_code and calculate 200-day rolling mean
-    df['dma_200'] = df.groupby('scheme_code')['nav'].transform(
-        lambda x: x.rolling(window=200, min_periods=200).mean()
-    )
+    # Both passes below work on the same nav array and scheme boundaries
+    # (df is sorted by scheme_code, date), so they are extracted only once
+    nav = df['nav'].to_numpy(dtype=float)
+    scheme_codes = df['scheme_code']
+    if isinstance(scheme_codes.dtype, pd.CategoricalDtype):
+        # The small integer category codes mark the same boundaries without
+        # materialising the scheme_code values
+        scheme_codes = scheme_codes.cat.codes
+    group_starts = _group_starts(scheme_codes.to_numpy())
+    counts = np.diff(np.append(group_starts, len(nav)))
+
+    # Calculate 200-day rolling mean per scheme
+    df['dma_200'] = _rolling_mean_by_group(nav, group_starts, window=200)
     
     # Detect significant jumps (>10%) within the window
-    # Calculate daily percentage change
-    df['pct_change'] = df.groupby('scheme_code')['nav'].pct_change()
+    # Absolute daily percentage change; undefined on each scheme's first row
+    abs_change = np.full(len(nav), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        abs_change[1:] = np.abs(nav[1:] / nav[:-1] - 1)
+    abs_change[group_starts] = np.nan
     
     # Check if any jump > 10% (0.1) occurred in the 200-day window
     # rolling window of 200 checks if ANY of the values was > 10%
-    df['has_jump'] = df.groupby('scheme_code')['pct_change'].transform(
-        lambda x: x.abs().rolling(window=200, min_periods=1).max() > 0.1
-    )
+    # (only evaluated where the 200-day average itself is defined)
+    has_jump = _rolling_max_by_group(abs_change, group_starts, window=200) > 0.1
     
     # Identifying schemes that have at least one jump in their data
     # We want to exclude schemes if a jump occurred in the window we are analyzing
     # Exclude schemes where the CURRENT (latest) record has a jump in its 200-day window.
-    
+    # The latest record is the last row of each scheme's block, so the flag
+    # is broadcast back over the block instead of grouping by scheme_code.
+    jumpy = np.repeat(has_jump[group_starts + counts - 1], counts)
+
     # Only keep rows where we have enough data for 200-day average
-    df = df.dropna(subset=['dma_200'])
+    # AND where the scheme is not jumpy
+    return df[df['dma_200'].notna().to_numpy() & ~jumpy]
 
-    # Calculate which schemes have a jump in their LATEST window (after filtering)
-    latest_per_scheme = df.groupby('scheme_code').tail(1).copy()
-    jumpy_schemes = latest_per_scheme.loc[latest_per_scheme['has_jump'], 'scheme_code'].unique()
+def has_trading_days_data(conn: sqlite3.Connection) -> bool:
+    """
+    Check whether get_trading_days_data would return any rows, without
+    loading them.
+    """
+    query = """
+    SELECT 1
+    FROM nav n
+    JOIN schemes s ON n.scheme_code = s.scheme_code
+    WHERE n.nav IS NOT NULL
+      AND strftime('%w', n.date) NOT IN ('0', '6')
+      AND lower(s.scheme_name) NOT LIKE '%liquid fund%'
+      AND lower(s.scheme_name) NOT LIKE '%overnight fund%'
+    LIMIT 1
+    """
+    return conn.execute(query).fetchone() is not None
 
-    # AND where the scheme is not jumpy
-    df = df[~df['scheme_code'].isin(jumpy_schemes)]
-    # Drop intermediate columns so downstream consumers don't pick them up
-    df = df.drop(columns=['pct_change', 'has_jump'], errors='ignore')
+def get_latest_dma_per_scheme(conn: sqlite3.Connection) -> pd.DataFrame:
+    """
+    Calculate the 200-day moving average inside SQLite using window functions.
+    Applies the same weekend, scheme name and NAV jump filters as
+    get_trading_days_data and calculate_200_dma, but only the latest row of
+    each qualifying scheme is returned instead of the full NAV history.
+    Requires SQLite 3.25 or newer.
+    """
+    # Number the trading days of each scheme from the latest backwards, keep
+    # the latest 201 (200 for the average plus one so the oldest daily change
+    # in the window has its previous NAV) and aggregate those per scheme.
+    query = """
+    WITH ranked AS (
+        SELECT
+            n.scheme_code,
+            n.date,
+            n.nav,
+            s.scheme_name,
+            ROW_NUMBER() OVER (PARTITION BY n.scheme_code ORDER BY n.date DESC) AS rn
+        FROM nav n
+        JOIN schemes s ON n.scheme_code = s.scheme_code
+        WHERE n.nav IS NOT NULL
+          AND strftime('%w', n.date) NOT IN ('0', '6')
+          AND lower(s.scheme_name) NOT LIKE '%liquid fund%'
+          AND lower(s.scheme_name) NOT LIKE '%overnight fund%'
+    ),
+    recent AS (
+        SELECT
+            *,
+            ABS(nav * 1.0 / LAG(nav) OVER (PARTITION BY scheme_code ORDER BY date) - 1) AS abs_change
+        FROM ranked
+        WHERE rn <= 201
+    )
+    SELECT
+        scheme_code,
+        MAX(CASE WHEN rn = 1 THEN date END) AS date,
+        MAX(CASE WHEN rn = 1 THEN nav END) AS nav,
+        scheme_name,
+        AVG(nav) AS dma_200
+    FROM recent
+    WHERE rn <= 200
+    GROUP BY scheme_code, scheme_name
+    HAVING COUNT(*) = 200
+       AND (MAX(abs_change) IS NULL OR MAX(abs_change) <= 0.1)
+    ORDER BY scheme_code
+    """
+
+    df = pd.read_sql_query(query, conn, parse_dates=['date'])
 
     return df
 
@@ -97,8 +251,9 @@ def get_latest_nav_per_scheme(df: pd.DataFrame) -> pd.DataFrame:
     Only includes schemes whose latest record is recent (within last 200 days).
     """
     # Get the most recent date for each filtered scheme
+    # (sort=False: input is already ordered by scheme_code, no need to re-sort keys)
     latest_data = (
-        df.loc[df.groupby('scheme_code')['date'].idxmax()].reset_index(drop=True)
+        df.loc[df.groupby('scheme_code', sort=False, observed=True)['date'].idxmax()].reset_index(drop=True)
     )
     
     # Filter out stale records (active in last 200 days)
@@ -119,47 +274,32 @@ def deduplicate_schemes(df: pd.DataFrame) -> pd.DataFrame:
     # Work on a local copy to avoid mutating the caller's DataFrame
     df = df.copy()
         
-    def normalize_name(name):
-        # Convert to lowercase and remove common descriptors using word-boundary
-        # replacements for alphabetic keywords and simple replacements for
-        # punctuation tokens so we don't remove substrings inside longer words.
-        n = name.lower()
-
-        # Alphabetic / phrase keywords: remove only as whole words/phrases
-        word_keywords = [
-            'direct plan', 'regular plan', 'growth option', 'idcw option',
-            'direct', 'regular', 'plan', 'growth', 'idcw', 'payout', 'reinvestment',
-            'option', 'fund', 'funds', 'scheme'
-        ]
-
-        for kw in word_keywords:
-            pattern = r"\b" + re.escape(kw) + r"\b"
-            n = re.sub(pattern, ' ', n)
-
-        # Punctuation tokens and technical codes: replace directly.
-        # Process longer tokens first so substrings (e.g. 'p-g') don't
-        # match inside longer tokens (e.g. 'dp-g').
-        punct_tokens = ['p-g', 'dp-g', 'p-i', 'dp-i', '-', '(', ')', '.', ',', '...']
-        for tok in sorted(punct_tokens, key=len, reverse=True):
-            n = n.replace(tok, ' ')
+    # Normalize names by removing common plan/option descriptors. Alphabetic
+    # keywords are removed only as whole words/phrases so we don't remove
+    # substrings inside longer words; punctuation tokens and technical codes
+    # are removed anywhere. Longer alternatives come first so e.g. 'dp-g' is
+    # matched before 'p-g'. Each step runs as one vectorized .str operation.
+    word_keywords = re.compile(
+        r"\b(?:direct plan|regular plan|growth option|idcw option|direct|regular|plan"
+        r"|growth|idcw|payout|reinvestment|option|fund|funds|scheme)\b"
+    )
+    punct_tokens = re.compile(r"dp-g|dp-i|p-g|p-i|[-().,]")
 
+    names = df['scheme_name'].str.lower()
+    df['normalized_name'] = (
+        names.str.replace(word_keywords, ' ', regex=True)
+        .str.replace(punct_tokens, ' ', regex=True)
         # Clean up extra spaces
-        return ' '.join(n.split())
-
-    df['normalized_name'] = df['scheme_name'].apply(normalize_name)
+        .str.replace(r"\s+", ' ', regex=True)
+        .str.strip()
+    )
     
     # Priority for sorting within duplicates: Direct > Regular, Growth > IDCW
-    def get_priority(name):
-        p = 0
-        n = name.lower()
-        # Use word-boundary regex so we only match whole words like 'direct'/'growth'
-        if re.search(r"\bdirect\b", n):
-            p += 10
-        if re.search(r"\bgrowth\b", n):
-            p += 5
-        return p
-
-    df['priority'] = df['scheme_name'].apply(get_priority)
+    # Use word-boundary regex so we only match whole words like 'direct'/'growth'
+    df['priority'] = (
+        names.str.contains(r"\bdirect\b").astype(int) * 10
+        + names.str.contains(r"\bgrowth\b").astype(int) * 5
+    )
     
     # Sort and take the best match for each normalized name
     df = df.sort_values(['normalized_name', 'priority', 'nav'], ascending=[True, False, False])
@@ -173,15 +313,19 @@ def classify_funds(latest_data: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFram
     Returns tuple of (funds_above_dma, funds_below_dma)
     """
     # Calculate percentage difference from 200-DMA
-    latest_data['dma_diff_pct'] = ((latest_data['nav'] - latest_data['dma_200']) / latest_data['dma_200'] * 100)
+    nav = latest_data['nav'].to_numpy()
+    dma = latest_data['dma_200'].to_numpy()
+    latest_data['dma_diff_pct'] = (nav - dma) / dma * 100
     
-    # Classify funds
-    funds_above_dma = latest_data[latest_data['nav'] > latest_data['dma_200']].copy()
-    funds_below_dma = latest_data[latest_data['nav'] < latest_data['dma_200']].copy()
+    # Sort once by percentage difference (descending). Funds above the DMA
+    # are the leading positive rows; funds below are the trailing negative
+    # rows, reversed so they are ascending.
+    ranked = latest_data.sort_values('dma_diff_pct', ascending=False, kind='stable')
+    diff = ranked['dma_diff_pct'].to_numpy()
     
-    # Sort by percentage difference (descending for above, ascending for below)
-    funds_above_dma = funds_above_dma.sort_values('dma_diff_pct', ascending=False)
-    funds_below_dma = funds_below_dma.sort_values('dma_diff_pct', ascending=True)
+    # Classify funds
+    funds_above_dma = ranked[diff > 0]
+    funds_below_dma = ranked[diff < 0].iloc[::-1]
     
     return funds_above_dma, funds_below_dma
 
@@ -212,9 +356,19 @@ def format_table_for_markdown(df: pd.DataFrame, title: str, max_rows: int = 50)
     markdown += "| Code | Scheme Name | Current NAV | 200-DMA | Difference (%) |\n"
     markdown += "|------|-------------|-------------|---------|----------------|\n"
     
-    for _, row in display_df.iterrows():
-        scheme_name = row['scheme_name'][:60] + "..." if len(row['scheme_name']) > 60 else row['scheme_name']
-        markdown += f"| {row['scheme_code']} | {scheme_name} | {row['nav']} | {row['dma_200']} | {row['dma_diff_pct']:+.2f}% |\n"
+    # Build all rows from plain column lists and join once, rather than
+    # boxing every row into a Series and growing the string row by row
+    rows = [
+        f"| {code} | {name[:60] + '...' if len(name) > 60 else name} | {nav} | {dma} | {diff:+.2f}% |\n"
+        for code, name, nav, dma, diff in zip(
+            display_df['scheme_code'].tolist(),
+            display_df['scheme_name'].tolist(),
+            display_df['nav'].tolist(),
+            display_df['dma_200'].tolist(),
+            display_df['dma_diff_pct'].tolist(),
+        )
+    ]
+    markdown += "".join(rows)
     
     return markdown
 
@@ -257,19 +411,33 @@ def main():
         print("Connecting to database...")
         conn = connect_to_db()
         
-        # Get trading days data (excluding weekends)
-        print("Loading NAV data (excluding weekends)...")
-        df = get_trading_days_data(conn)
-        
-        if df.empty:
-            print("No NAV data found in database.")
-            sys.exit(1)
-        
-        print(f"Loaded {len(df)} NAV records for {df['scheme_code'].nunique()} schemes")
-        
-        # Calculate 200-day moving averages
-        print("Calculating 200-day moving averages...")
-        df_with_dma = calculate_200_dma(df)
+        if sqlite3.sqlite_version_info >= (3, 25, 0):
+            if not has_trading_days_data(conn):
+                print("No NAV data found in database.")
+                sys.exit(1)
+            
+            # Let SQLite evaluate the windows so only one row per scheme is loaded
+            print("Calculating 200-day moving averages in SQLite (excluding weekends)...")
+            df_with_dma = get_latest_dma_per_scheme(conn)
+        else:
+            # Get trading days data (excluding weekends)
+            print("Loading NAV data (excluding weekends)...")
+            df = get_trading_days_data(conn)
+            
+            if df.empty:
+                print("No NAV data found in database.")
+                sys.exit(1)
+            
+            print(f"Loaded {len(df)} NAV records for {df['scheme_code'].nunique()} schemes")
+            
+            # Only the latest 200-day window of each scheme is reported, so
+            # drop older history up front (201 rows: the oldest one is only
+            # needed for the first daily change in the window)
+            df = df.groupby('scheme_code', observed=True).tail(201)
+            
+            # Calculate 200-day moving averages
+            print("Calculating 200-day moving averages...")
+            df_with_dma = calculate_200_dma(df)
         
         schemes_with_dma = df_with_dma['scheme_code'].nunique()
         print(f"Calculated 200-DMA for {schemes_with_dma} schemes (schemes with at least 200 trading days)")
@@ -2,8 +2,26 @@ import os
 import sys
 import datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import zipfile
+import io
+from zip_helpers import write_csv_as_zip
+
+# Number of downloads in flight at once. The downloads are network-bound,
+# so more concurrent requests hide more round-trip latency.
+MAX_WORKERS = 16
+
+# Shared session so worker threads reuse keep-alive connections to AMFI
+# instead of opening a new TCP+TLS connection for every day. The pool holds
+# one connection per worker so none are discarded and re-opened.
+session = requests.Session()
+adapter = HTTPAdapter(
+    pool_connections=MAX_WORKERS,
+    pool_maxsize=MAX_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+)
+session.mount('https://', adapter)
 
 def daterange(start_date, end_date):
     for n in range(int((end_date - start_date).days)):
@@ -14,23 +32,23 @@ def should_fetch_file(path):
 
 def fetch_file(date, url, out_path):
     try:
-        resp = requests.get(url, timeout=30)
-        resp.raise_for_status()
         # Save as a zipped CSV to reduce repo size: DD.zip containing DD.csv
         zip_path = out_path.replace('.csv', '.zip')
         inner_name = os.path.basename(out_path)
-        os.makedirs(os.path.dirname(zip_path), exist_ok=True)
-        # Write response content into a zip archive
-        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
-            zf.writestr(inner_name, resp.content)
-        # Remove file if HTML (error page)
-        if b"<html>" in resp.content[:4096]:
-            # remove zip if it's an HTML error page
-            try:
-                os.remove(zip_path)
-            except OSError:
-                pass
-            return f"Skipped (HTML): {zip_path}"
+        with session.get(url, timeout=30, stream=True) as resp:
+            resp.raise_for_status()
+            # Read the body as a decoded file object; urllib3 would otherwise
+            # close it at EOF, before the buffered reader sees the end
+            resp.raw.decode_content = True
+            resp.raw.auto_close = False
+            body = io.BufferedReader(resp.raw, buffer_size=65536)
+            # Peek at the first block only, so an HTML error page is dropped
+            # without downloading the rest of it or touching the disk
+            if b"<html>" in body.peek(4096)[:4096]:
+                return f"Skipped (HTML): {zip_path}"
+            # Stream the response into the archive; it replaces an existing
+            # DD.zip only once the download is complete
+            write_csv_as_zip(body, zip_path, inner_name)
         return f"Fetched: {zip_path}"
     except Exception as e:
         return f"Error {out_path}: {e}"
@@ -58,21 +76,23 @@ def main():
         end_date = today
         print(f"Starting date is {d}")
 
+    # Check for file existence : data/YYYY-MM-DD (no extension, no subfolders)
+    # List the folder once instead of a stat() call for every day in the range
+    legacy_files = set()
+    if os.path.isdir("data"):
+        with os.scandir("data") as entries:
+            legacy_files = {entry.name for entry in entries if entry.is_file()}
+
     tasks = []
     for single_date in daterange(d, end_date):
-        year = single_date.strftime("%Y")
-        month = single_date.strftime("%m")
-        day = single_date.strftime("%d")
-        # Check for file existence : data/YYYY-MM-DD (no extension, no subfolders)
-        legacy_path = f"data/{single_date.strftime('%Y-%m-%d')}"
-        out_path = f"data/{year}/{month}/{day}.csv"
-        if not os.path.isfile(legacy_path):
+        if single_date.isoformat() not in legacy_files:
+            out_path = f"data/{single_date:%Y/%m/%d}.csv"
             df = single_date.strftime("%d-%b-%Y")
             url = f"https://portal.amfiindia.com/DownloadNAVHistoryReport_Po.aspx?frmdt={df}"
             tasks.append((single_date, url, out_path))
 
     print(f"Total files to fetch: {len(tasks)}")
-    with ThreadPoolExecutor(max_workers=8) as executor:
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         future_to_task = {executor.submit(fetch_file, *task): task for task in tasks}
         for future in as_completed(future_to_task):
             print(future.result())
@@ -126,20 +126,20 @@ def insert_securities(conn, isins):
 
 def insert_schemes(conn, schemes):
     c = conn.cursor()
-    for scheme_code, scheme_name in schemes.items():
-        c.execute(
-            "INSERT INTO schemes VALUES (?, ?)",
-            (scheme_code, scheme_name),
-        )
+    c.executemany(
+        "INSERT INTO schemes VALUES (?, ?)",
+        schemes.items(),
+    )
 
 def insert_data(conn):
     c = conn.cursor()
     # scheme, date, nav
-    for data in get_data(conn):
-        c.execute(
-            "INSERT INTO nav VALUES (?, date(?), ?)",
-            (data[0], data[1], data[2]),
-        )
+    # executemany consumes the generator directly, so the statement is
+    # prepared once and rows are bound in C instead of one execute() per row
+    c.executemany(
+        "INSERT INTO nav VALUES (?, date(?), ?)",
+        get_data(conn),
+    )
 
 if __name__ == "__main__":
     # delete file funds.db
@@ -4,10 +4,10 @@ Test script for DMA calculations with sample data.
 """
 
 import sqlite3
+import numpy as np
 import pandas as pd
 import os
 import sys
-from datetime import datetime, timedelta
 import tempfile
 
 def create_test_database():
@@ -18,6 +18,12 @@ def create_test_database():
     
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
+    # Throwaway database: keep the journal in memory and skip fsyncs
+    cursor.executescript('''
+        PRAGMA journal_mode=MEMORY;
+        PRAGMA synchronous=OFF;
+        PRAGMA temp_store=MEMORY;
+    ''')
     
     # Create tables
     cursor.execute('''
@@ -45,55 +51,49 @@ def create_test_database():
         )
     ''')
     
-    # Insert test schemes
+    # Test schemes
     schemes = [
         (1, "Test Growth Fund"),
         (2, "Sample Equity Fund"),
         (3, "Demo Balanced Fund")
     ]
     
-    cursor.executemany('INSERT INTO schemes VALUES (?, ?)', schemes)
-    
     # Generate test NAV data for 300 trading days (excluding weekends)
-    base_date = datetime(2023, 1, 1)
+    dates = pd.bdate_range('2023-01-02', periods=300).strftime('%Y-%m-%d').tolist()
+    rng = np.random.default_rng(10)  # Reproducible randomness
     nav_data = []
     
-    for scheme_code in [1, 2, 3]:
-        current_date = base_date
-        nav_value = 100.0 + scheme_code * 10  # Different starting values
-        
-        trading_days = 0
-        while trading_days < 300:
-            # Skip weekends
-            if current_date.weekday() < 5:  # Monday=0, Friday=4
-                # Add some randomness to NAV (simulate market movements)
-                import random
-                random.seed(scheme_code * 1000 + trading_days)  # Reproducible randomness
-                change = random.uniform(-0.02, 0.02)  # ±2% daily change
-                nav_value *= (1 + change)
-                
-                nav_data.append((scheme_code, current_date.strftime('%Y-%m-%d'), round(nav_value, 4)))
-                trading_days += 1
-            
-            current_date += timedelta(days=1)
-    
-    cursor.executemany('INSERT INTO nav VALUES (?, ?, ?)', nav_data)
+    for scheme_code, _ in schemes:
+        # Simulate market movements: compound a ±2% daily change onto a
+        # different starting value per scheme
+        changes = rng.uniform(-0.02, 0.02, len(dates))
+        navs = np.cumprod(1 + changes) * (100.0 + scheme_code * 10)
+        nav_data.extend(
+            (scheme_code, date, round(nav, 4)) for date, nav in zip(dates, navs.tolist())
+        )
     
-    # Insert test securities
+    # Test securities
     securities = [
         ("INF123456789", 0, 1),
         ("INF987654321", 0, 2),
         ("INF111222333", 0, 3)
     ]
-    cursor.executemany('INSERT INTO securities VALUES (?, ?, ?)', securities)
     
-    conn.commit()
+    # Insert everything in a single transaction
+    with conn:
+        cursor.executemany('INSERT INTO schemes VALUES (?, ?)', schemes)
+        cursor.executemany('INSERT INTO nav VALUES (?, ?, ?)', nav_data)
+        cursor.executemany('INSERT INTO securities VALUES (?, ?, ?)', securities)
+    cursor.execute('CREATE INDEX idx_nav_code_date ON nav(scheme_code, date)')
+    
     conn.close()
     
     return db_path
 
 def test_dma_basic_logic():
-    """Test the basic DMA calculation logic without importing the main module."""
+    """Test the basic DMA calculation logic on a sample database."""
+    import calculate_dma
+
     # Create test database
     test_db = create_test_database()
     
@@ -101,10 +101,9 @@ def test_dma_basic_logic():
         # Test database connection
         print("Testing database connection...")
         conn = sqlite3.connect(test_db)
-        
-        # Test data loading (similar to get_trading_days_data)
-        print("Testing data loading...")
-        query = """
+        # Trading-day NAVs with scheme names, defined once per connection
+        conn.execute("""
+        CREATE TEMP VIEW v_nav AS
         SELECT 
             n.scheme_code,
             n.date,
@@ -113,23 +112,37 @@ def test_dma_basic_logic():
         FROM nav n
         JOIN schemes s ON n.scheme_code = s.scheme_code
         WHERE n.nav IS NOT NULL
-        ORDER BY n.scheme_code, n.date
-        """
+          AND strftime('%w', n.date) NOT IN ('0', '6')  -- skip weekends
+        """)
         
-        df = pd.read_sql_query(query, conn)
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Remove weekends
-        df = df[~df['date'].dt.weekday.isin([5, 6])]
-        df = df.sort_values(['scheme_code', 'date']).reset_index(drop=True)
+        # Test data loading (similar to get_trading_days_data)
+        print("Testing data loading...")
+        # The view is flattened into the query, so idx_nav_code_date still
+        # serves the ORDER BY and rows arrive sorted
+        df = pd.read_sql_query(
+            "SELECT * FROM v_nav ORDER BY scheme_code, date", conn,
+            parse_dates=['date'],
+            dtype={'scheme_code': 'int32', 'nav': 'float64'}
+        )
         
         print(f"Loaded {len(df)} NAV records for {df['scheme_code'].nunique()} schemes")
         
         # Test 200-DMA calculation
         print("Testing 200-DMA calculation...")
-        df['dma_200'] = df.groupby('scheme_code')['nav'].transform(
-            lambda x: x.rolling(window=200, min_periods=200).mean()
-        )
+        # Prefix-sum kernel: each window sum is the difference of two
+        # cumulative sums inside the scheme's block of rows
+        nav = df['nav'].to_numpy(dtype=float)
+        group_starts = calculate_dma._group_starts(df['scheme_code'].to_numpy())
+        df['dma_200'] = calculate_dma._rolling_mean_by_group(nav, group_starts, window=200)
+        # One grouper for every per-scheme step below
+        gb = df.groupby('scheme_code', sort=False)
+
+        # Cross-check with pandas: one rolling pass over the whole sorted
+        # column; a window only belongs to a single scheme once that scheme
+        # has 200 rows, so mask the rest
+        rolling_mean = df['nav'].rolling(window=200, min_periods=200).mean()
+        expected_dma = rolling_mean.where(gb.cumcount() >= 199)
+        assert np.allclose(df['dma_200'], expected_dma, equal_nan=True)
         
         df_with_dma = df.dropna(subset=['dma_200'])
         schemes_with_dma = df_with_dma['scheme_code'].nunique()
@@ -137,34 +150,49 @@ def test_dma_basic_logic():
         
         # Test getting latest data
         print("Testing latest data extraction...")
-        latest_data = df_with_dma.groupby('scheme_code').apply(
-            lambda x: x.loc[x['date'].idxmax()]
-        ).reset_index(drop=True)
+        # Rows are sorted by (scheme_code, date), so the last row of each
+        # scheme is its latest one; it has a DMA only if the scheme has one
+        latest_data = gb.tail(1).dropna(subset=['dma_200']).reset_index(drop=True)
         
         print(f"Latest data for {len(latest_data)} schemes")
         
         # Test classification
         print("Testing classification...")
-        latest_data['dma_diff_pct'] = ((latest_data['nav'] - latest_data['dma_200']) / latest_data['dma_200'] * 100)
+        nav = latest_data['nav'].to_numpy()
+        dma = latest_data['dma_200'].to_numpy()
+        diff = (nav - dma) / dma * 100.0
+        latest_data = latest_data.assign(dma_diff_pct=diff)
         
-        funds_above_dma = latest_data[latest_data['nav'] > latest_data['dma_200']].copy()
-        funds_below_dma = latest_data[latest_data['nav'] < latest_data['dma_200']].copy()
+        # The sign of the difference already encodes the NAV/DMA comparison;
+        # the filtered frames are only counted, so no copies are needed
+        funds_above_dma = latest_data[diff > 0]
+        funds_below_dma = latest_data[diff < 0]
         
         print(f"Funds above 200-DMA: {len(funds_above_dma)}")
         print(f"Funds below 200-DMA: {len(funds_below_dma)}")
         
         # Show sample results
         print("\nSample results:")
-        for _, row in latest_data.iterrows():
-            status = "ABOVE" if row['nav'] > row['dma_200'] else "BELOW"
-            diff_pct = row['dma_diff_pct']
-            print(f"{row['scheme_name']}: Current NAV={row['nav']:.4f}, 200-DMA={row['dma_200']:.4f}, Status={status} ({diff_pct:+.2f}%)")
+        lines = [
+            f"{name}: Current NAV={nav:.4f}, 200-DMA={dma:.4f}, "
+            f"Status={'ABOVE' if nav > dma else 'BELOW'} ({diff_pct:+.2f}%)"
+            for name, nav, dma, diff_pct in zip(
+                latest_data['scheme_name'].tolist(),
+                latest_data['nav'].tolist(),
+                latest_data['dma_200'].tolist(),
+                latest_data['dma_diff_pct'].tolist(),
+            )
+        ]
+        sys.stdout.write("\n".join(lines) + "\n")
         
         conn.close()
         print("\nBasic DMA logic test passed successfully!")
         
         return True
         
+    except AssertionError:
+        # Let failed checks fail the test run instead of being reported
+        raise
     except Exception as e:
         print(f"Test failed: {e}")
         import traceback
@@ -177,7 +205,108 @@ def test_dma_basic_logic():
                 os.unlink(test_db)
         except:
             pass  # Ignore cleanup errors on Windows
+
+def test_rolling_kernels_match_pandas():
+    """Test the NumPy rolling kernels against pandas' per-group rolling."""
+    import calculate_dma
+
+    rng = np.random.default_rng(0)
+    # Groups shorter than, equal to and longer than the window
+    codes = np.repeat([10, 20, 30, 40], [150, 200, 450, 613])
+    values = rng.uniform(10, 500, len(codes))
+    changes = np.abs(rng.normal(0, 0.05, len(codes)))
+    changes[rng.random(len(codes)) < 0.05] = np.nan
+
+    group_starts = calculate_dma._group_starts(codes)
+    grouped = lambda v: pd.Series(v).groupby(codes).rolling(200, min_periods=200)
+
+    mean = calculate_dma._rolling_mean_by_group(values, group_starts, window=200)
+    expected_mean = grouped(values).mean().to_numpy()
+    assert np.allclose(mean, expected_mean, equal_nan=True)
+
+    # pandas' max needs 200 non-NaN values; the kernel needs 200 rows
+    maximum = calculate_dma._rolling_max_by_group(changes, group_starts, window=200)
+    expected_max = pd.Series(changes).groupby(codes).rolling(200, min_periods=1).max().to_numpy()
+    full = ~np.isnan(expected_mean)
+    assert np.array_equal(np.isnan(maximum), ~full)
+    assert np.array_equal(maximum[full], expected_max[full], equal_nan=True)
+
+def test_sql_dma_matches_pandas():
+    """Test that the SQLite window query agrees with the pandas DMA pipeline."""
+    import calculate_dma
+
+    test_db = create_test_database()
+    conn = sqlite3.connect(test_db)
+    try:
+        # Add rows that each of the query's filters must drop
+        dates = pd.bdate_range('2023-01-02', periods=300)
+        last_date = dates[-1]
+        rng = np.random.default_rng(7)
+        extra_schemes = [
+            (4, "Test Liquid Fund", 300, None),     # excluded by name
+            (5, "Jumpy Equity Fund", 300, 250),     # >10% jump in the window
+            (6, "New Equity Fund", 150, None),      # fewer than 200 rows
+            (7, "Steady Equity Fund", 300, 50),     # jump before the window
+        ]
+        nav_rows = []
+        for scheme_code, _, days, jump_at in extra_schemes:
+            navs = np.cumprod(1 + rng.uniform(-0.01, 0.01, days)) * 100.0
+            if jump_at is not None:
+                navs[jump_at:] *= 1.15
+            nav_rows.extend(
+                (scheme_code, date, round(nav, 4))
+                for date, nav in zip(dates[-days:].strftime('%Y-%m-%d'), navs.tolist())
+            )
+        # A weekend NAV after the last trading day, far off the trend
+        saturday = last_date + pd.Timedelta(days=5 - last_date.dayofweek)
+        nav_rows.append((1, saturday.strftime('%Y-%m-%d'), 1000.0))
+        with conn:
+            conn.executemany('INSERT INTO schemes VALUES (?, ?)',
+                             [(code, name) for code, name, _, _ in extra_schemes])
+            conn.executemany('INSERT INTO nav VALUES (?, ?, ?)', nav_rows)
+
+        expected = calculate_dma.get_latest_nav_per_scheme(
+            calculate_dma.calculate_200_dma(calculate_dma.get_trading_days_data(conn))
+        )
+        actual = calculate_dma.get_latest_dma_per_scheme(conn)
+
+        assert list(actual['scheme_code']) == list(expected['scheme_code'])
+        assert list(actual['date']) == list(expected['date'])
+        assert (actual['dma_200'] - expected['dma_200'].to_numpy()).abs().max() < 1e-9
+        assert list(actual['scheme_code']) == [1, 2, 3, 7]
+        assert (actual['date'] == last_date).all()
+    finally:
+        conn.close()
+        try:
+            if os.path.exists(test_db):
+                os.unlink(test_db)
+        except:
+            pass  # Ignore cleanup errors on Windows
+
+def test_deduplicate_schemes_prefers_direct_growth():
+    """Test that plan/option variants collapse to the Direct Growth scheme."""
+    import calculate_dma
+
+    df = pd.DataFrame({
+        'scheme_code': [1, 2, 3, 4, 5],
+        'scheme_name': [
+            "Axis Bluechip Fund - Regular Plan - Growth",
+            "Axis Bluechip Fund - Direct Plan - Growth",
+            "Axis Bluechip Fund - Direct Plan - IDCW Payout",
+            "Axis Bluechip Fund (DP-G)",
+            "Axis Planned Savings Fund",
+        ],
+        'nav': [50.0, 55.0, 20.0, 54.0, 10.0],
+    })
+
+    result = calculate_dma.deduplicate_schemes(df)
+
+    assert sorted(result['scheme_code']) == [2, 5]
+    assert 'normalized_name' not in result.columns
     
 if __name__ == "__main__":
     success = test_dma_basic_logic()
+    test_rolling_kernels_match_pandas()
+    test_sql_dma_matches_pandas()
+    test_deduplicate_schemes_prefers_direct_growth()
     sys.exit(0 if success else 1)
@@ -1,11 +1,51 @@
+import contextlib
 import os
+import shutil
 import tempfile
+import uuid
 import zipfile
 
-def write_csv_as_zip(csv_bytes, zip_path, inner_name):
-    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
-    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr(inner_name, csv_bytes)
+def write_csv_as_zip(csv_bytes, zip_path, inner_name,
+                     compression=zipfile.ZIP_DEFLATED, compresslevel=None):
+    """Write csv_bytes to zip_path as the single member inner_name.
+    csv_bytes may also be a binary file object, which is streamed into the
+    archive in 1 MiB blocks instead of being read into memory first.
+    Deflate keeps the archives readable by any zip tool; pass compresslevel=1
+    for faster, slightly larger output, or zipfile.ZIP_ZSTANDARD (Python 3.14+)
+    where every reader supports it.
+    """
+    zip_dir = os.path.dirname(zip_path)
+    os.makedirs(zip_dir, exist_ok=True)
+    # Write to a sibling temp file and rename it over zip_path, so readers
+    # never see a partially written archive. A plain open() (rather than
+    # tempfile, which creates files 0600) gives it the usual permissions.
+    tmp_path = f"{zip_path}.{uuid.uuid4().hex}.tmp"
+    tmp = open(tmp_path, 'xb')
+    try:
+        with tmp, zipfile.ZipFile(tmp, 'w', compression=compression,
+                                  compresslevel=compresslevel) as zf:
+            if hasattr(csv_bytes, 'read'):
+                # Size is unknown up front, so allow for a member over 2 GiB
+                with zf.open(inner_name, 'w', force_zip64=True) as dst:
+                    shutil.copyfileobj(csv_bytes, dst, length=1 << 20)
+            else:
+                # writestr already writes the buffer straight to the compressor
+                zf.writestr(inner_name, csv_bytes)
+        os.replace(tmp_path, zip_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def _find_csv_member(zf, member_name=None):
+    name = member_name
+    if name is None:
+        for n in zf.namelist():
+            if n.endswith('.csv'):
+                name = n
+                break
+    if name is None:
+        raise ValueError('No CSV member found in zip')
+    return name
 
 def extract_csv_from_zip(zip_path, member_name=None, extract_dir=None):
     """Extract a CSV from zip_path. If member_name is None, extract the first .csv found.
@@ -14,15 +54,22 @@ def extract_csv_from_zip(zip_path, member_name=None, extract_dir=None):
     if extract_dir is None:
         extract_dir = tempfile.mkdtemp(prefix='navdata_')
     with zipfile.ZipFile(zip_path, 'r') as zf:
-        name = member_name
-        if name is None:
-            for n in zf.namelist():
-                if n.endswith('.csv'):
-                    name = n
-                    break
-        if name is None:
-            raise ValueError('No CSV member found in zip')
+        name = _find_csv_member(zf, member_name)
         out_path = os.path.join(extract_dir, os.path.basename(name))
-        with open(out_path, 'wb') as f:
-            f.write(zf.read(name))
+        # Copy in 1 MiB blocks instead of reading the whole member into memory
+        with zf.open(name, 'r') as src, open(out_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, length=1 << 20)
     return out_path
+
+@contextlib.contextmanager
+def open_csv_in_zip(zip_path, member_name=None):
+    """Open a CSV inside zip_path for reading without extracting it to disk.
+    If member_name is None, open the first .csv found.
+    Yields a binary file object, e.g. for pd.read_csv:
+
+        with open_csv_in_zip(path) as f:
+            df = pd.read_csv(f, sep=';')
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        with zf.open(_find_csv_member(zf, member_name), 'r') as f:
+            yield f